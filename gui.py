@@ -5,10 +5,9 @@ This script provides a graphical frontend to the recorder.py and player.py
 scripts.
 """
 
-import time
 import json
-from PySide6.QtCore import Qt, QThread, Signal
-from PySide6.QtGui import QPixmap, QIcon
+from PySide6.QtCore import QSize, QThread, Signal, Slot
+from PySide6.QtGui import QIcon, QLocale, QDoubleValidator, QIntValidator
 from PySide6.QtWidgets import (QApplication, QMainWindow, QPushButton,
                                QHBoxLayout, QWidget, QFileDialog,
                                QSizePolicy, QMessageBox, QDialog,
@@ -16,6 +15,31 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QPushButton,
 from recorder import Record, Recorder, load_records_from_json
 from player import Player
 
+# Button icons keyed by asset path. Icons cannot be constructed before a
+# QApplication exists so the cache is filled lazily by _load_icons() the first
+# time a window is built. QIcon scales its source image to the button's icon
+# size when first painted and caches the result, so no pixmaps are pre-scaled.
+_ICON_CACHE = {}
+
+
+def _load_icons(image_paths: list[str]) -> dict[str, QIcon]:
+    """Return the icon cache after loading any asset not already cached."""
+    for image_path in image_paths:
+        if image_path not in _ICON_CACHE:
+            _ICON_CACHE[image_path] = QIcon(image_path)
+    return _ICON_CACHE
+
+
+def _load_toggle_icon(off_path: str, on_path: str) -> QIcon:
+    """Return a cached icon that shows on_path while its button is checked."""
+    key = (off_path, on_path)
+    if key not in _ICON_CACHE:
+        icon = QIcon()
+        icon.addFile(off_path, QSize(), QIcon.Mode.Normal, QIcon.State.Off)
+        icon.addFile(on_path, QSize(), QIcon.Mode.Normal, QIcon.State.On)
+        _ICON_CACHE[key] = icon
+    return _ICON_CACHE[key]
+
 
 class ProgramSettingsDialog(QDialog):  # pylint: disable=too-few-public-methods
     """Define a program settings input dialog box."""
@@ -30,6 +54,17 @@ class ProgramSettingsDialog(QDialog):  # pylint: disable=too-few-public-methods
         self._speed_input = QLineEdit(self)
         self._rate_input = QLineEdit(self)
 
+        # Reject non-numeric keystrokes as they are typed. The C locale keeps
+        # the accepted text parsable by float() and int().
+        c_locale = QLocale.c()
+        c_locale.setNumberOptions(QLocale.NumberOption.RejectGroupSeparator)
+        speed_validator = QDoubleValidator(0.0001, 1e6, 4, self)
+        speed_validator.setLocale(c_locale)
+        rate_validator = QIntValidator(1, 100000, self)
+        rate_validator.setLocale(c_locale)
+        self._speed_input.setValidator(speed_validator)
+        self._rate_input.setValidator(rate_validator)
+
         form_layout.addRow("Playback Speed Multiplier:", self._speed_input)
         form_layout.addRow("Rate of Recording (Hz):", self._rate_input)
         layout.addLayout(form_layout)
@@ -42,10 +77,19 @@ class ProgramSettingsDialog(QDialog):  # pylint: disable=too-few-public-methods
 
         self._ok_button.clicked.connect(self.accept)
         self._cancel_button.clicked.connect(self.reject)
+        self._speed_input.textChanged.connect(self._update_ok_button)
+        self._rate_input.textChanged.connect(self._update_ok_button)
 
         layout.addLayout(button_layout)
         self.setLayout(layout)
 
+    def _update_ok_button(self) -> None:
+        # Empty fields leave the current setting unchanged, partially typed
+        # values (e.g., "0") must be completed before the dialog is accepted.
+        self._ok_button.setEnabled(all(
+            not line_edit.text() or line_edit.hasAcceptableInput()
+            for line_edit in (self._speed_input, self._rate_input)))
+
     def get_inputs(self) -> tuple[str, str]:
         """Return a tuple containing the playback speed and recording rate strings."""
         return self._speed_input.text(), self._rate_input.text()
@@ -55,32 +99,66 @@ class PlaybackWorker(QThread):  # pylint: disable=too-few-public-methods
     """Qt worker thread used to playback a recording."""
 
     finished = Signal()
+    failed = Signal(str)
 
     def __init__(self,
                  player: Player,
-                 playback_complete_ts: float,
                  playback_records: list[Record],
                  playback_multiplier: float):
         """Construct the thread with all relevant playback data."""
         super().__init__()
         self._player = player
-        self._playback_complete_ts = playback_complete_ts
         self._playback_records = playback_records
         self._playback_multiplier = playback_multiplier
 
     def run(self):
         """Run the player and wait (block) until it completes playback."""
-        self._player.start(
-            self._playback_records, speed=self._playback_multiplier)
+        try:
+            self._player.start(
+                self._playback_records, speed=self._playback_multiplier)
+        except (ValueError, AttributeError) as e:
+            self.failed.emit(str(e))
+            return
+
         self._player.wait()
-        self._playback_complete_ts[0] = time.time()
 
         self.finished.emit()
 
 
+class LoaderWorker(QThread):  # pylint: disable=too-few-public-methods
+    """Qt worker thread used to load a recording from disk."""
+
+    loaded = Signal(list)
+    failed = Signal(str)
+
+    def __init__(self, filename: str):
+        """Construct the thread with the path of the recording to load."""
+        super().__init__()
+        self._filename = filename
+
+    def run(self):
+        """Load the recording and emit the records or an error message."""
+        try:
+            records = load_records_from_json(self._filename)
+        except (json.decoder.JSONDecodeError, ValueError, TypeError, UnicodeDecodeError,
+                KeyError, OSError) as e:
+            self.failed.emit(str(e))
+            return
+
+        self.loaded.emit(records)
+
+
 class MainWindow(QMainWindow):  # pylint: disable=too-few-public-methods, too-many-instance-attributes
     """Define the PySide6 main application window."""
 
+    # Button colors are selected through a dynamic "state" property so the
+    # stylesheet is parsed once rather than on every button toggle.
+    _STYLESHEET = """
+        QPushButton { background-color: white; }
+        QPushButton[state="recording"] { background-color: red; }
+        QPushButton[state="playing"] { background-color: green; }
+    """
+
     def __init__(self):
         """Construct the main window and macro Recorder/Player instances."""
         super().__init__()
@@ -92,6 +170,7 @@ class MainWindow(QMainWindow):  # pylint: disable=too-few-public-methods, too-ma
         layout.setContentsMargins(0, 0, 0, 0)
         layout.setSpacing(0)
         central_widget.setLayout(layout)
+        central_widget.setStyleSheet(self._STYLESHEET)
         self.setCentralWidget(central_widget)
 
         # Define button images and tooltips.
@@ -103,24 +182,19 @@ class MainWindow(QMainWindow):  # pylint: disable=too-few-public-methods, too-ma
             ("assets/settings.png", "Display program settings."),
         ]
 
+        icons = _load_icons([image_path for image_path, _ in self.button_info])
+
         self._buttons = []
         for i, (image_path, tooltip_text) in enumerate(self.button_info):
             button = QPushButton()
-            pixmap = QPixmap(image_path)
-            pixmap = pixmap.scaled(
-                32, 32, Qt.AspectRatioMode.IgnoreAspectRatio)
-            icon = QIcon(pixmap)
-            button.setIcon(icon)
-            button.setIconSize(pixmap.size())
+            button.setIcon(icons[image_path])
+            button.setIconSize(QSize(32, 32))
             button.setToolTip(tooltip_text)
-            button.setStyleSheet("background-color: white;")
 
             if i == 0:
-                button.clicked.connect(
-                    lambda _, btn=button: self._toggle_recording(btn))
-            if i == 1:
-                button.clicked.connect(
-                    lambda _, btn=button: self._playback(btn))
+                button.clicked.connect(self._toggle_recording)
+            elif i == 1:
+                button.clicked.connect(self._playback)
             elif i == 2:
                 button.clicked.connect(self._open_file_save_dialog)
             elif i == 3:
@@ -133,61 +207,100 @@ class MainWindow(QMainWindow):  # pylint: disable=too-few-public-methods, too-ma
             layout.addWidget(button)
             self._buttons.append(button)
 
+        # The play button is checkable and shows a stop icon while checked,
+        # i.e., while a playback is active. Qt picks the pixmap matching the
+        # button's state so no icons are swapped on click.
+        self._buttons[1].setCheckable(True)
+        self._buttons[1].setIcon(
+            _load_toggle_icon("assets/play.png", "assets/stop.png"))
+
         self.setFixedSize(250, 50)
 
         self._recorder = Recorder()
         self._player = Player()
         self._playback_records = []
-        self._playback_complete_ts = [0.0]
+        self._playback_thrd = None
+        self._loader_thrd = None
+        self._is_playing = False
         self._has_unsaved_data = False
         self._record_rate_hz = 100
         self._playback_multiplier = 1.0
 
-    def _toggle_recording(self, button) -> None:
-        # If the user records using the GUI's record button, the last action in
-        # the recording will be clicking the record button to toggle recording
-        # off. This is problematic during playback because at the end of the
-        # playback, a new recording will be triggered. A simple solution is to
-        # not allow recordings for a tenth of a second after playback has
-        # completed.
-        dt = time.time() - self._playback_complete_ts[0]
-        if dt < 0.1:
+    def _set_button_state(self, button, state: str) -> None:
+        if button.property("state") == state:
             return
 
-        current_color = button.styleSheet().split(': ')[1].strip(';')
-        if current_color == "white":
+        # Qt only re-evaluates property selectors when the widget is polished.
+        button.setProperty("state", state)
+        button.style().unpolish(button)
+        button.style().polish(button)
+
+    @Slot()
+    def _toggle_recording(self) -> None:
+        button = self.sender()
+        if not self._recorder.is_recording():
             self._recorder.start(rate_hz=self._record_rate_hz)
             self._has_unsaved_data = True
+            self._set_button_state(button, "recording")
         else:
             self._recorder.stop()
             self._playback_records = self._recorder.get_records()
+            self._set_button_state(button, "idle")
 
-        new_color = "red" if current_color == "white" else "white"
-        button.setStyleSheet(f"background-color: {new_color};")
-
+    @Slot()
     def _playback_complete(self) -> None:
-        self._buttons[1].setStyleSheet("background-color: white;")
+        self._is_playing = False
+        self._buttons[0].setEnabled(True)
+        self._buttons[1].setChecked(False)
+        self._set_button_state(self._buttons[1], "idle")
+
+    @Slot(str)
+    def _playback_failed(self, error: str) -> None:
+        self._playback_complete()
+        QMessageBox.critical(
+            self, "Error", f"Failed to playback recording: {error}")
+
+    @Slot()
+    def _playback(self) -> None:
+        button = self.sender()
+        if self._is_playing:
+            button.setChecked(True)
+            try:
+                self._player.stop()
+            except RuntimeError:
+                # Playback finished on its own before the stop request, the
+                # worker's finished signal resets the button.
+                pass
+            return
 
-    def _playback(self, button) -> None:
         if self._recorder.is_recording():
+            button.setChecked(False)
             QMessageBox.critical(
                 self, "Error", "Cannot playback while recording is in progress.")
             return
 
         if not self._playback_records:
+            button.setChecked(False)
             QMessageBox.critical(
                 self, "Error",
                 "No data available. Try recording some data or loading data from a file.")
             return
 
-        button.setStyleSheet("background-color: green;")
+        # If the user records using the GUI's record button, the last action in
+        # the recording will be clicking the record button to toggle recording
+        # off. Replaying that click would trigger a new recording, so the record
+        # button stays disabled until the playback worker signals completion.
+        self._is_playing = True
+        self._set_button_state(button, "playing")
+        self._buttons[0].setEnabled(False)
         self._playback_thrd = PlaybackWorker(self._player,
-                                             self._playback_complete_ts,
                                              self._playback_records,
                                              self._playback_multiplier)
         self._playback_thrd.finished.connect(self._playback_complete)
+        self._playback_thrd.failed.connect(self._playback_failed)
         self._playback_thrd.start()
 
+    @Slot()
     def _open_file_save_dialog(self) -> None:
         if self._recorder.is_recording():
             QMessageBox.critical(
@@ -199,13 +312,13 @@ class MainWindow(QMainWindow):  # pylint: disable=too-few-public-methods, too-ma
                 self, "Information", "Ignoring save request, there's no recording to save.")
             return
 
-        options = QFileDialog.Options()
         filename, _ = QFileDialog.getSaveFileName(
-            self, "Save File", "", "All Files (*);;Text Files (*.txt)", options=options)
+            self, "Save File", "", "All Files (*);;Text Files (*.txt)")
         if filename:
             self._recorder.save(filename)
             self._has_unsaved_data = False
 
+    @Slot()
     def _open_file_open_dialog(self) -> None:
         if self._recorder.is_recording():
             QMessageBox.critical(
@@ -226,42 +339,37 @@ class MainWindow(QMainWindow):  # pylint: disable=too-few-public-methods, too-ma
             else:
                 return
 
-        options = QFileDialog.Options()
         filename, _ = QFileDialog.getOpenFileName(
-            self, "Open File", "", "All Files (*);;Text Files (*.txt)", options=options)
+            self, "Open File", "", "All Files (*);;Text Files (*.txt)")
 
         if filename:
-            try:
-                self._playback_records = load_records_from_json(filename)
-            except (json.decoder.JSONDecodeError, ValueError, TypeError, UnicodeDecodeError) as e:
-                QMessageBox.critical(
-                    self, "Error", f"Failed to read recording: {e}")
-
+            self._buttons[3].setEnabled(False)
+            self._loader_thrd = LoaderWorker(filename)
+            self._loader_thrd.loaded.connect(self._load_complete)
+            self._loader_thrd.failed.connect(self._load_failed)
+            self._loader_thrd.start()
+
+    @Slot(list)
+    def _load_complete(self, records: list[Record]) -> None:
+        self._playback_records = records
+        self._buttons[3].setEnabled(True)
+
+    @Slot(str)
+    def _load_failed(self, error: str) -> None:
+        self._buttons[3].setEnabled(True)
+        QMessageBox.critical(
+            self, "Error", f"Failed to read recording: {error}")
+
+    @Slot()
     def _open_settings_dialog(self) -> None:
         dialog = ProgramSettingsDialog()
         if dialog.exec() == QDialog.Accepted:
+            # The dialog's validators only accept positive values.
             playback_multiplier, record_rate_hz = dialog.get_inputs()
-            try:
-                if playback_multiplier:
-                    multiplier = float(playback_multiplier)
-                    if multiplier <= 0.0:
-                        raise ValueError()
-
-                    self._playback_multiplier = multiplier
-            except (TypeError, ValueError):
-                QMessageBox.critical(
-                    self, "Error", "Playback multiplier must be a positive floating point value.")
-
-            try:
-                if record_rate_hz:
-                    rate = int(record_rate_hz)
-                    if rate <= 0:
-                        raise ValueError
-
-                    self._record_rate_hz = rate
-            except (TypeError, ValueError):
-                QMessageBox.critical(
-                    self, "Error", "Recording rate must be a positive integer.")
+            if playback_multiplier:
+                self._playback_multiplier = float(playback_multiplier)
+            if record_rate_hz:
+                self._record_rate_hz = int(record_rate_hz)
 
 
 if __name__ == "__main__":
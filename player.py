@@ -6,153 +6,256 @@ player.py -h/--help
 """
 
 import time
+import functools
 import argparse
 import threading
 import pynput
 import pyautogui
 from recorder import Record, load_records_from_json
+from timing import precise_sleep, high_resolution_timer
+
+# Mouse buttons that can be played back keyed by the string the Recorder
+# captured for them.
+_BUTTON_MAP = {
+    "Button.left": pynput.mouse.Button.left,
+    "Button.right": pynput.mouse.Button.right,
+    "Button.middle": pynput.mouse.Button.middle,
+}
+
+
+@functools.lru_cache(maxsize=256)
+def _get_key_obj(key_str: str):
+    """Return the pynput key matching a key string captured by the Recorder."""
+    # For normal alphabetic characters, we return the character itself.
+    if len(key_str) == 1:
+        return key_str
+
+    # If it's a special key, we return the corresponding Key object from the Key class.
+    if key_str.startswith("Key."):
+        return getattr(pynput.keyboard.Key, key_str.split('.')[1])
+
+    return key_str
 
 
 class Player:  # pylint: disable=too-many-instance-attributes
     """Playback a recording captured by a Recorder object."""
 
-    def _get_key_obj(self, key_str: str):
-        # For normal alphabetic characters, we return the character itself.
-        if len(key_str) == 1:
-            return key_str
+    def _move_mouse(self, mouse_pos: tuple[int]) -> None:
+        # Idle stretches of a recording repeat the same position, only issue a
+        # move when the cursor target actually changes.
+        if mouse_pos == self._last_mouse_pos:
+            return
 
-        # If it's a special key, we return the corresponding Key object from the Key class.
-        if key_str.startswith("Key."):
-            return getattr(pynput.keyboard.Key, key_str.split('.')[1])
+        self._mouse.position = tuple(mouse_pos)
+        self._last_mouse_pos = mouse_pos
 
-        return key_str
+    def _validate_mouse_positions(self,
+                                  records: list[Record]  # pylint: disable=redefined-outer-name
+                                  ) -> None:
+        # Check every position once up front rather than on each move so a
+        # recording made on a larger screen fails before playback begins.
+        screen_width, screen_height = pyautogui.size()
+        for record in records:
+            x, y = record.mouse_pos
+            if not 0 <= x < screen_width:
+                raise ValueError(
+                    f"mouse x coordinate {x} out of range [0,{screen_width}]")
+            if not 0 <= y < screen_height:
+                raise ValueError(
+                    f"mouse y coordinate {y} out of range [0,{screen_height}]")
+
+    def _drop_idle_records(self,
+                           records: list[Record]  # pylint: disable=redefined-outer-name
+                           ) -> list[Record]:
+        # A recording samples the mouse at a fixed rate so idle periods produce
+        # long runs of records that repeat the previous position without any
+        # input. Dropping them leaves the schedule intact since deadlines are
+        # taken from the timestamps of the records that remain. The last record
+        # is always kept so a trailing idle stretch still plays for its full
+        # duration.
+        active_records = records[:1]
+        for record in records[1:-1]:
+            if (record.mouse_pos != active_records[-1].mouse_pos or
+                    record.button or record.scroll or record.keys):
+                active_records.append(record)
+        if len(records) > 1:
+            active_records.append(records[-1])
+        return active_records
+
+    def _resolve_button(self, button: tuple[str, bool]) -> tuple | None:
+        if not button:
+            return None
 
-    def _move_mouse(self, mouse_pos: tuple[int]) -> None:
-        # pyautogui automatically inserts a ~50ms delay on each mouse movement.
-        # Setting PAUSE to 0 disables this feature.
-        pyautogui.PAUSE = 0
+        button_str, is_pressed = button[0], button[1]
+        if button_str not in _BUTTON_MAP:
+            raise ValueError(f"unknown button type '{button}'")
+        return _BUTTON_MAP[button_str], is_pressed
 
-        screen_width, screen_height = pyautogui.size()
-        if not 0 <= mouse_pos[0] < screen_width:
-            raise ValueError(
-                f"mouse x coordinate {mouse_pos[0]} out of range [0,{screen_width}]")
-        if not 0 <= mouse_pos[1] < screen_height:
-            raise ValueError(
-                f"mouse y coordinate {mouse_pos[1]} out of range [0,{screen_height}]")
-        pyautogui.moveTo(mouse_pos)
-
-    def _click_button(self, button: tuple[str, bool]) -> None:
+    def _click_button(self, button: tuple | None) -> None:
         if not button:
             return
 
-        button_str, is_pressed = button[0], button[1]
-        if button_str in ["Button.left", "Button.right", "Button.middle"]:
-            if is_pressed:
-                pyautogui.mouseDown(button=button_str.removeprefix("Button."))
-            else:
-                pyautogui.mouseUp(button=button_str.removeprefix("Button."))
+        button_obj, is_pressed = button
+        if is_pressed:
+            self._mouse.press(button_obj)
         else:
-            raise ValueError(f"unknown button type '{button}'")
+            self._mouse.release(button_obj)
 
     def _scroll(self, scroll: tuple[int, int]) -> None:
         if not scroll:
             return
 
         dx, dy = scroll[0], scroll[1]
-        if dy != 0:
-            pyautogui.scroll(dy)
-        if dx != 0:
-            pyautogui.hscroll(dx)
-
-    def _press_and_release_key_combo(self,
-                                     keys: list[tuple[str, float]],
-                                     keypress_cache: dict[str, float]) -> None:
-        if not keys:
-            return
+        self._mouse.scroll(dx, dy)
 
+    def _precompute_key_combos(self,
+                               records: list[Record]  # pylint: disable=redefined-outer-name
+                               ) -> list[list]:
         # To avoid pressing duplicate keys, we must filter keypresses by
         # timestamp. A few special keys are exempt from timestamp filtering.
-        key_strs = []
-        exempt_keys = ["Key.ctrl", "Key.alt", "Key.shift", "Key.cmd"]
-        for key in keys:
-            key_str, timestamp = key[0], key[1]
-            if key_str in exempt_keys:
-                key_strs.append(key_str)
-            elif not key_str in keypress_cache or timestamp > keypress_cache[key_str]:
-                keypress_cache[key_str] = timestamp
-                key_strs.append(key_str)
-
-        # Press and release the key combo.
-        keyboard = pynput.keyboard.Controller()
-        key_objs = [self._get_key_obj(key) for key in key_strs]
-        for k in key_objs:
-            keyboard.press(k)
-        for k in key_objs:
-            keyboard.release(k)
-
-    def _execute_event(self, record: Record, keypress_cache: dict[str, float]) -> None:
-        self._move_mouse(record.mouse_pos)
-        self._click_button(record.button)
-        self._scroll(record.scroll)
-        self._press_and_release_key_combo(record.keys, keypress_cache)
-
-    def _playback(self) -> None:  # pylint: disable=redefined-outer-name
+        # The filter only depends on the recording so it runs once before
+        # playback and each record is left with the pynput keys to press.
+        key_combos = []
         keypress_cache = {}
-        for i in range(1, len(self._records)):
-            # Check if we need to pause execution.
-            with self._pause_cv:
-                if self._is_paused:
-                    self._pause_cv.wait()
-
-            # Check if we have been asked to stop before the end of the playback.
-            with self._stop_requested_lock:
-                if self._stop_requested:
-                    break
+        exempt_keys = ["Key.ctrl", "Key.alt", "Key.shift", "Key.cmd"]
+        for record in records:
+            key_objs = []
+            for key in record.keys or []:
+                key_str, timestamp = key[0], key[1]
+                if key_str in exempt_keys:
+                    key_objs.append(_get_key_obj(key_str))
+                elif not key_str in keypress_cache or timestamp > keypress_cache[key_str]:
+                    keypress_cache[key_str] = timestamp
+                    key_objs.append(_get_key_obj(key_str))
+            key_combos.append(key_objs)
+        return key_combos
+
+    def _press_and_release_key_combo(self, key_objs: list) -> None:
+        if not key_objs:
+            return
 
-            curr_event = self._records[i - 1]
-            next_event = self._records[i]
-            dt = next_event.timestamp - curr_event.timestamp
+        # pressed() presses the keys in order and releases them in reverse
+        # order on exit.
+        with self._keyboard.pressed(*key_objs):
+            pass
 
-            self._execute_event(curr_event, keypress_cache)
+    def _execute_event(self, i: int) -> None:
+        self._move_mouse(self._mouse_positions[i])
+        self._click_button(self._buttons[i])
+        self._scroll(self._scrolls[i])
+        self._press_and_release_key_combo(self._key_combos[i])
 
-            time.sleep(dt / self._speed)
+    def _playback(self) -> None:  # pylint: disable=redefined-outer-name
+        # Bind everything the loop touches to locals, local lookups are cheaper
+        # than the attribute and global lookups they replace.
+        perf_counter_ns = time.perf_counter_ns
+        resume_event = self._resume_event
+        stop_event = self._stop_event
+        wake_event = self._wake_event
+        execute_event = self._execute_event
+
+        start_ns = perf_counter_ns()
+        with high_resolution_timer():
+            for i, deadline_ns in enumerate(self._deadlines_ns):
+                # With idle records dropped a single wait can span a long idle
+                # stretch. pause() and stop() set the wake event to cut the
+                # wait short, the checks below then run again before waiting
+                # out the rest of the interval.
+                while True:
+                    wake_event.clear()
+
+                    # Check if we need to pause execution. Time spent paused
+                    # shifts the remaining schedule.
+                    if not resume_event.is_set():
+                        pause_start_ns = perf_counter_ns()
+                        resume_event.wait()
+                        start_ns += perf_counter_ns() - pause_start_ns
+
+                    # Check if we have been asked to stop before the end of the
+                    # playback.
+                    if stop_event.is_set():
+                        break
+
+                    # Sleeping until an absolute deadline rather than for a
+                    # fixed delay keeps the time spent executing events from
+                    # accumulating as drift. When an event runs late it is
+                    # executed immediately.
+                    if precise_sleep(start_ns + deadline_ns, wake_event):
+                        break
+
+                if stop_event.is_set():
+                    break
 
-        self._execute_event(self._records[-1], keypress_cache)
+                execute_event(i)
 
-        with self._wait_cv:
-            with self._is_playing_lock:
-                self._is_playing = False
-            self._wait_cv.notify()
+        with self._is_playing_lock:
+            self._is_playing = False
+        self._done.set()
 
     def __init__(self):
         """Construct a mouse/keyboard recording player."""
-        self._records = []
-        self._speed = 1.0
+        # Events are injected through pynput directly. pyautogui wraps the same
+        # platform calls with failsafe and pause checks on every call and is
+        # only used to query the screen size.
+        self._mouse = pynput.mouse.Controller()
+        self._keyboard = pynput.keyboard.Controller()
+        self._mouse_positions = []
+        self._buttons = []
+        self._scrolls = []
+        self._key_combos = []
+        self._deadlines_ns = []
+        self._last_mouse_pos = None
 
         self._is_playing = False
         self._is_playing_lock = threading.Lock()
-        self._is_paused = False
-        self._pause_cv = threading.Condition()
-        self._stop_requested = False
-        self._stop_requested_lock = threading.Lock()
-        self._wait_cv = threading.Condition()
+        # The resume event is set while playback is not paused. Checking an
+        # Event that is set does not block so the playback loop polls both
+        # events on every iteration without taking any locks.
+        self._resume_event = threading.Event()
+        self._stop_event = threading.Event()
+        # Set by pause() and stop() to interrupt a wait between two events.
+        self._wake_event = threading.Event()
+        self._done = threading.Event()
         self._playback_thrd = None
         self._playback_complete_cb = None
 
     def start(self,
               records: list[Record],  # pylint: disable=redefined-outer-name
               speed: float = 1.0) -> None:
-        """Playback the recordings in the parameter list of records."""
+        """Playback the recordings in the parameter list of records.
+
+        Throws
+            RuntimeError: When playback is started while another playback is active.
+            ValueError: When a recorded mouse position lies outside of the screen or
+                        a recorded mouse button is unknown.
+        """
         with self._is_playing_lock:
             if self._is_playing:
                 raise RuntimeError(
                     "cannot play a new recording while playback is active")
 
-        self._records = records
-        self._speed = speed
+        self._validate_mouse_positions(records)
+
+        records = self._drop_idle_records(records)
+
+        # Split the records into one list per field so the playback loop indexes
+        # flat lists rather than looking up attributes on every Record.
+        self._mouse_positions = [record.mouse_pos for record in records]
+        self._buttons = [self._resolve_button(record.button)
+                         for record in records]
+        self._scrolls = [record.scroll for record in records]
+        self._key_combos = self._precompute_key_combos(records)
+        # The time at which each event is due, relative to the start of the
+        # playback, only depends on the recording and the playback speed so it
+        # is computed once up front. The first event is due immediately.
+        self._deadlines_ns = [
+            round((record.timestamp - records[0].timestamp) / speed * 1e9)
+            for record in records]
+        self._last_mouse_pos = None
         self._is_playing = True
-        self._is_paused = False
-        self._stop_requested = False
+        self._resume_event.set()
+        self._stop_event.clear()
+        self._done.clear()
         self._playback_thrd = threading.Thread(
             target=self._playback)
 
@@ -165,22 +268,21 @@ class Player:  # pylint: disable=too-many-instance-attributes
                 raise RuntimeError(
                     "pause called but recording was never started")
 
-        with self._pause_cv:
-            if self._is_paused:
-                self._is_paused = False
-                self._pause_cv.notify()
-            else:
-                self._is_paused = True
+        if self._resume_event.is_set():
+            self._resume_event.clear()
+        else:
+            self._resume_event.set()
+        self._wake_event.set()
 
     def wait(self) -> None:
         """Block the calling thread until the recording has finished playing."""
-        with self._is_playing_lock:
-            if not self._is_playing:
-                raise RuntimeError(
-                    "wait called but recording is not playing")
+        # _done is cleared by start() so waiting on a playback that has already
+        # finished returns immediately.
+        if self._playback_thrd is None:
+            raise RuntimeError(
+                "wait called but recording was never started")
 
-        with self._wait_cv:
-            self._wait_cv.wait()
+        self._done.wait()
 
     def stop(self) -> None:
         """Stop the active playback."""
@@ -190,12 +292,11 @@ class Player:  # pylint: disable=too-many-instance-attributes
                     "stop called but recording is not playing")
             self._is_playing = False
 
-        with self._stop_requested_lock:
-            self._stop_requested = True
-
-        with self._pause_cv:
-            if self._is_paused:
-                self.pause()
+        # Resume a paused playback and interrupt any wait between events so the
+        # playback thread observes the stop request.
+        self._stop_event.set()
+        self._resume_event.set()
+        self._wake_event.set()
 
         self._playback_thrd.join()
 
@@ -9,21 +9,37 @@ recorder.py's companion script: playback.py. To see script usage and all
 available command line options run: recorder.py -h/--help
 """
 
-import json
-import copy
+import mmap
+import queue
 import time
 import argparse
 import threading
 from dataclasses import dataclass
+import orjson
 import pynput
+from timing import high_resolution_timer
 
 
-@dataclass
+# Maps special keys and mouse buttons to their string form. Both are enum
+# members so the cache stays as small as the enums themselves.
+_STR_CACHE = {}
+
+
+def _to_str(obj) -> str:
+    """Return str(obj), formatting each special key or button only once."""
+    s = _STR_CACHE.get(obj)
+    if s is None:
+        s = str(obj)
+        _STR_CACHE[obj] = s
+    return s
+
+
+@dataclass(slots=True)
 class Record:
     """Representation of a single recording event.
 
     Fields
-        timestamp: The number of seconds since the Epoch.
+        timestamp: The number of seconds since the start of the recording.
         mouse_pos: (x, y) position of the mouse.
         keys: A list of tuples where the first element is the actively pressed
               key and the second element is a timestamp of when the key was pressed.
@@ -40,148 +56,173 @@ class Record:
     button: tuple[str, bool]
     scroll: tuple[int, int]
 
-    def clear(self) -> None:
-        """Clear the contents of this Record object."""
-        self.timestamp = None
-        self.mouse_pos = None
-        self.keys = None
-        self.button = None
-        self.scroll = None
-
 
 def save_records_to_json(json_filepath: str, records: list[Record]) -> None:
     """Output a list of Record objects to a JSON file."""
     if not records:
         raise RuntimeError("failed to save, list of records is empty")
 
-    with open(json_filepath, "w", encoding="ascii") as file:
-        record_dicts = []
-        for r in records:
-            record_dict = {
-                "timestamp": r.timestamp,
-                "mouse_pos": r.mouse_pos,
-                "keys": r.keys,
-                "button": r.button,
-                "scroll": r.scroll
-            }
-            record_dicts.append(record_dict)
-        output = {"records": record_dicts}
-        json.dump(output, file, indent=2)
+    # orjson serializes dataclasses natively so no intermediate dicts are
+    # built. Each record is written compactly on its own line which keeps the
+    # file readable at roughly half the size of fully indented output. Records
+    # are written one at a time so the serialized recording is never held in
+    # memory as a whole.
+    with open(json_filepath, "wb") as file:
+        separator = b'{"records": [\n'
+        for record in records:
+            file.write(separator)
+            file.write(orjson.dumps(record))  # pylint: disable=no-member
+            separator = b",\n"
+        file.write(b"\n]}\n")
 
 
 def load_records_from_json(json_filepath: str) -> list[Record]:
     """Read a list of Record objects from the parameter JSON file."""
-    with open(json_filepath, "r", encoding="ascii") as file:
-        data = json.load(file)
-        records = []
-        for record in data["records"]:
-            records.append(Record(
-                record["timestamp"],
-                record["mouse_pos"],
-                record["keys"],
-                record["button"],
-                record["scroll"],
-            ))
-    return records
+    # Parse straight out of the page cache rather than first copying the whole
+    # file into a bytes object.
+    with open(json_filepath, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                data = orjson.loads(view)  # pylint: disable=no-member
+
+    return [Record(record["timestamp"],
+                   record["mouse_pos"],
+                   record["keys"],
+                   record["button"],
+                   record["scroll"])
+            for record in data["records"]]
 
 
 class Recorder:  # pylint: disable=too-many-instance-attributes
     """The Recorder class records mouse and keyboard events."""
 
     def _on_release(self, key) -> None:
-        def update_keys(key_str: str) -> None:
-            with self._active_keys_lock:
-                if self._active_keys:
-                    with self._record_lock:
-                        self._record.keys = copy.deepcopy(self._active_keys)
-                        self._active_keys = [
-                            x for x in self._active_keys if x[0] != key_str]
-
+        if self._stop.is_set():
+            return
         if hasattr(key, "char"):
-            update_keys(str(key.char))
+            self._events.put(("release", str(key.char)))
         else:
-            update_keys(str(key))
-
-    def _on_press(self, key) -> None:
-        with self._active_keys_lock:
-            if hasattr(key, "char"):
-                # Capture single character keys.
-                self._active_keys.append((str(key.char), time.time()))
-            else:
-                # Capture special keys (e.g., shift, ctrl).
-                self._active_keys.append((str(key), time.time()))
-
-    def _record_key_events(self) -> None:
-        with self._terminate_cv:
-            press_listener = pynput.keyboard.Listener(on_press=self._on_press)
-            release_listener = pynput.keyboard.Listener(
-                on_release=self._on_release)
+            self._events.put(("release", _to_str(key)))
 
-            press_listener.start()
-            release_listener.start()
+    def _elapsed_sec(self) -> float:
+        # The monotonic performance counter is immune to wall clock
+        # adjustments (e.g., NTP steps) made during a recording. Truncating
+        # to whole microseconds keeps the serialized timestamps short.
+        return (time.perf_counter_ns() - self._start_ns) // 1000 / 1e6
 
-            self._terminate_cv.wait()
-
-            press_listener.stop()
-            release_listener.stop()
+    def _on_press(self, key) -> None:
+        # Events still queued by the platform when the recording stops are
+        # dropped here rather than enqueued for a sampler that has exited.
+        if self._stop.is_set():
+            return
+        if hasattr(key, "char"):
+            # Capture single character keys.
+            self._events.put(("press", (str(key.char), self._elapsed_sec())))
+        else:
+            # Capture special keys (e.g., shift, ctrl).
+            self._events.put(("press", (_to_str(key), self._elapsed_sec())))
 
     def _on_click(self, x, y, button, is_pressed) -> None:  # pylint: disable=unused-argument
-        with self._record_lock:
-            self._record.button = (str(button), is_pressed)
+        if self._stop.is_set():
+            return
+        self._events.put(("button", (_to_str(button), is_pressed)))
 
     def _on_scroll(self, x, y, dx, dy) -> None:  # pylint: disable=unused-argument
-        with self._record_lock:
-            if dy > 0 or dy < 0:
-                self._record.scroll = (0, dy)
-            if dx > 0 or dx < 0:
-                self._record.scroll = (dx, 0)
-
-    def _record_mouse_events(self) -> None:
-        with self._terminate_cv:
-            click_listener = pynput.mouse.Listener(on_click=self._on_click)
-            scroll_listener = pynput.mouse.Listener(on_scroll=self._on_scroll)
-
-            click_listener.start()
-            scroll_listener.start()
-
-            self._terminate_cv.wait()
-
-            click_listener.stop()
-            scroll_listener.stop()
-
-    def _update_records(self) -> None:
+        if self._stop.is_set():
+            return
+        if dx > 0 or dx < 0:
+            self._events.put(("scroll", (dx, 0)))
+        elif dy > 0 or dy < 0:
+            self._events.put(("scroll", (0, dy)))
+
+    def _drain_events(self) -> None:
+        # Listener callbacks only enqueue events. The staged fields and the
+        # active keys are touched by the sampler thread alone so none of them
+        # needs a lock.
         while True:
-            with self._is_recording_lock:
-                if not self._is_recording:
-                    break
-
-            with self._record_lock:
-                self._record.timestamp = time.time()
-                self._record.mouse_pos = pynput.mouse.Controller().position
-                self._records.append(copy.deepcopy(self._record))
-                self._record.clear()
+            try:
+                kind, value = self._events.get_nowait()
+            except queue.Empty:
+                return
+
+            if kind == "press":
+                key_str, timestamp = value
+                # Auto-repeat presses a held key again, each repeat keeps its
+                # own timestamp so that it is played back as a keystroke.
+                self._active_keys.setdefault(key_str, []).append(timestamp)
+            elif kind == "release":
+                if self._active_keys:
+                    self._last_keys = [(key, timestamp)
+                                       for key, timestamps in self._active_keys.items()
+                                       for timestamp in timestamps]
+                    self._active_keys.pop(value, None)
+            elif kind == "button":
+                self._last_button = value
+            elif kind == "scroll":
+                self._last_scroll = value
 
-            time.sleep(self._rate_sec)
+    def _update_records(self) -> None:
+        # The sampler runs for as long as the recording does, resolve the
+        # callables it uses on every tick once up front.
+        perf_counter_ns = time.perf_counter_ns
+        stop = self._stop
+        drain_events = self._drain_events
+        elapsed_sec = self._elapsed_sec
+        mouse_ctrl = self._mouse_ctrl
+        append_record = self._records.append
+
+        # Samples are scheduled against absolute deadlines so that the
+        # overshoot of each wait does not accumulate over the recording.
+        rate_ns = round(self._rate_sec * 1e9)
+        next_ns = perf_counter_ns()
+        with high_resolution_timer():
+            while not stop.is_set():
+                next_ns += rate_ns
+                drain_events()
+
+                # The staged fields are rebound rather than mutated so the
+                # snapshot can share them without copying.
+                append_record(Record(elapsed_sec(),
+                                     mouse_ctrl.position,
+                                     self._last_keys,
+                                     self._last_button,
+                                     self._last_scroll))
+                self._last_keys = None
+                self._last_button = None
+                self._last_scroll = None
+
+                # Each sample is timestamped when it is taken so a late wakeup
+                # does not distort the recording, and busy waiting would only
+                # hold the GIL against the listener threads. Waiting on the
+                # stop event also ends the wait as soon as recording stops.
+                stop.wait(max(0, next_ns - perf_counter_ns()) / 1e9)
 
     def __init__(self) -> None:
         """Initialize the Recorder."""
         self._rate_sec = 1.0
-        self._is_recording = False
-        self._record = Record(timestamp=None,
-                              mouse_pos=None,
-                              keys=None,
-                              button=None,
-                              scroll=None)
+        self._start_ns = 0
+        # Key, button and scroll state staged for the next sample.
+        self._last_keys = None
+        self._last_button = None
+        self._last_scroll = None
         self._records = []
-        self._active_keys = []
-
-        self._is_recording_lock = threading.Lock()
-        self._record_lock = threading.Lock()
-        self._active_keys_lock = threading.Lock()
-        self._terminate_cv = threading.Condition()
-
-        self._keypress_thrd = None
-        self._click_thrd = None
+        # Maps each held key to the timestamps of its presses, in order.
+        self._active_keys = {}
+        # Controller construction opens a connection to the platform's input
+        # layer, construct it once rather than on every sample.
+        self._mouse_ctrl = pynput.mouse.Controller()
+
+        # The stop event is set whenever no recording is in progress. The
+        # listener and sampler threads block on or poll it, an event that is
+        # set before a thread starts waiting is never missed.
+        self._stop = threading.Event()
+        self._stop.set()
+        self._events = queue.SimpleQueue()
+
+        # pynput listeners run their own threads, only the sampler needs a
+        # thread of ours.
+        self._key_listener = None
+        self._mouse_listener = None
         self._update_thrd = None
 
     def start(self, rate_hz: int = 100) -> None:
@@ -194,24 +235,25 @@ class Recorder:  # pylint: disable=too-many-instance-attributes
         Throws
             RuntimeError: When a new recording is initiated without stopping the previous recording.
         """
-        with self._is_recording_lock:
-            if self._is_recording:
-                raise RuntimeError("recording already in progress")
-            self._is_recording = True
+        if not self._stop.is_set():
+            raise RuntimeError("recording already in progress")
 
         self._rate_sec = 1.0 / rate_hz
+        self._start_ns = time.perf_counter_ns()
         self._records = []
-        self._active_keys = []
-
-        self._keypress_thrd = threading.Thread(
-            target=self._record_key_events)
-        self._click_thrd = threading.Thread(
-            target=self._record_mouse_events)
+        self._active_keys = {}
+        self._events = queue.SimpleQueue()
+        self._stop.clear()
+
+        self._key_listener = pynput.keyboard.Listener(
+            on_press=self._on_press, on_release=self._on_release)
+        self._mouse_listener = pynput.mouse.Listener(
+            on_click=self._on_click, on_scroll=self._on_scroll)
         self._update_thrd = threading.Thread(
             target=self._update_records)
 
-        self._keypress_thrd.start()
-        self._click_thrd.start()
+        self._key_listener.start()
+        self._mouse_listener.start()
         self._update_thrd.start()
 
     def stop(self) -> None:
@@ -220,30 +262,28 @@ class Recorder:  # pylint: disable=too-many-instance-attributes
         Throws
             RuntimeError: When stop() is called without a preceding call to start().
         """
-        with self._is_recording_lock:
-            if not self._is_recording:
-                raise RuntimeError(
-                    "stop called but a recording was never started")
-            self._is_recording = False
+        if self._stop.is_set():
+            raise RuntimeError(
+                "stop called but a recording was never started")
+
+        self._stop.set()
 
-        with self._terminate_cv:
-            self._terminate_cv.notify_all()
+        self._key_listener.stop()
+        self._mouse_listener.stop()
 
-        self._keypress_thrd.join()
-        self._click_thrd.join()
+        self._key_listener.join()
+        self._mouse_listener.join()
         self._update_thrd.join()
 
     def is_recording(self) -> bool:
         """Return the state of this Recorder."""
-        with self._is_recording_lock:
-            return self._is_recording
+        return not self._stop.is_set()
 
     def get_records(self) -> list[Record]:
         """Return all recorded Record objects."""
-        with self._is_recording_lock:
-            if self._is_recording:
-                raise RuntimeError(
-                    "cannot return records during active recording")
+        if not self._stop.is_set():
+            raise RuntimeError(
+                "cannot return records during active recording")
         return self._records
 
     def save(self, json_filepath: str) -> None:
@@ -253,9 +293,8 @@ class Recorder:  # pylint: disable=too-many-instance-attributes
             RuntimeError: When save() is called during an active recording
                           session or when there are no records to save.
         """
-        with self._is_recording_lock:
-            if self._is_recording:
-                raise RuntimeError("failed to save, recording in progress")
+        if not self._stop.is_set():
+            raise RuntimeError("failed to save, recording in progress")
 
         save_records_to_json(json_filepath, self._records)
 
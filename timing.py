@@ -0,0 +1,54 @@
+"""Timing helpers shared by the recorder and the player."""
+
+import sys
+import time
+import ctypes
+import threading
+import contextlib
+from collections.abc import Iterator
+
+
+# time.sleep() is only as accurate as the OS timer so the last stretch of each
+# wait is spent busy waiting on the high resolution performance counter.
+_SPIN_NS = 2_000_000
+
+
+def precise_sleep(target_ns: int,
+                  event: threading.Event = None,
+                  spin_ns: int = _SPIN_NS) -> bool:
+    """Block until time.perf_counter_ns() reaches target_ns.
+
+    Args
+        target_ns: The time.perf_counter_ns() value to wait for.
+        event: When given, the wait ends early as soon as the event is set.
+        spin_ns: How long before target_ns to stop sleeping and busy wait.
+
+    Returns
+        True when target_ns was reached, False when the event was set first.
+    """
+    coarse_ns = target_ns - time.perf_counter_ns() - spin_ns
+    if coarse_ns > 0:
+        if event is None:
+            time.sleep(coarse_ns / 1e9)
+        elif event.wait(coarse_ns / 1e9):
+            return False
+    while time.perf_counter_ns() < target_ns:
+        pass
+    return True
+
+
+@contextlib.contextmanager
+def high_resolution_timer() -> Iterator[None]:
+    """Raise the OS timer resolution to 1 ms for the duration of the block."""
+    # Windows defaults to a ~15.6 ms timer tick which makes every sleep
+    # overshoot by up to a tick. Other platforms already have fine timers.
+    if sys.platform != "win32":
+        yield
+        return
+
+    winmm = ctypes.WinDLL("winmm")
+    winmm.timeBeginPeriod(1)
+    try:
+        yield
+    finally:
+        winmm.timeEndPeriod(1)